@@ -1,10 +1,16 @@
 # pausebutton.py
-import sys, time, board, digitalio
+import board, digitalio
+
+try:
+    import countio  # native edge counter, where the build has it
+except ImportError:
+    countio = None
 
 class PauseButton:
     def __init__(self, button=None, leds=None, config_file=None):
         self.leds = leds
         self.paused = False
+        self._counter = None
 
         if config_file:
             self.button = self._load_from_file(config_file)
@@ -25,14 +31,20 @@ class PauseButton:
         # resolve pin object from board
         pin = getattr(board, pin_name)
 
-        # create DigitalInOut
-        dio = digitalio.DigitalInOut(pin)
-
         # apply direction
         if direction.upper() == "IN":
+            if countio is not None:
+                # Latch the falling edge in native code instead of
+                # polling a DigitalInOut every loop.
+                self._counter = countio.Counter(
+                    pin, edge=countio.Edge.FALL, pull=digitalio.Pull.UP
+                )
+                return None
+            dio = digitalio.DigitalInOut(pin)
             dio.direction = digitalio.Direction.INPUT
             dio.pull = digitalio.Pull.UP
         elif direction.upper() == "OUT":
+            dio = digitalio.DigitalInOut(pin)
             dio.direction = digitalio.Direction.OUTPUT
         else:
             raise ValueError("Invalid direction in config")
@@ -41,8 +53,13 @@ class PauseButton:
 
     def update(self):
         """Call this once per loop to check the button."""
-        if self.button and not self.button.value:
-            if self.leds:
-                self.leds.fill((0,0,0))
-            print("PauseButton pressed! Exiting...")
-            sys.exit()
+        if self._counter is not None:
+            if not self._counter.count:
+                return
+        elif not (self.button and not self.button.value):
+            return
+        if self.leds:
+            self.leds.fill((0,0,0))
+        print("PauseButton pressed! Exiting...")
+        import sys  # only needed on the exit path
+        sys.exit()
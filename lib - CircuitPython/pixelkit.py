@@ -3,18 +3,77 @@ PixelKit v2.0 for CircuitPython
 - Reads pause pin+direction from pausebutton_pin_config.txt
 """
 
-import sys
+import array
 import board
 import digitalio
 import analogio
+import supervisor
 import neopixel
 from adafruit_pixel_framebuf import PixelFramebuffer
 
+try:
+    import keypad  # native scanner, CircuitPython 7+
+except ImportError:
+    keypad = None
+
+try:
+    import countio  # native edge counter for the pause pin
+except ImportError:
+    countio = None
+
+try:
+    import analogbufio  # DMA-filled ADC buffers for the microphone
+except ImportError:
+    analogbufio = None
+
+# supervisor.ticks_ms() wraps at 2**29; mask differences into range.
+_TICKS_MAX = (1 << 29) - 1
+
+# Bits returned by PixelKit.poll_state(); order matches PixelKit.INPUT_NAMES.
+BTN_A = 0x01
+BTN_B = 0x02
+JS_UP = 0x04
+JS_DOWN = 0x08
+JS_LEFT = 0x10
+JS_RIGHT = 0x20
+JS_CLICK = 0x40
+
 
 class PixelKit:
-    # Class-level pin registries
-    _dio_registry = {}
-    _ain_registry = {}
+    # Class-level pin registries: small lists of (pin, instance) pairs.
+    # Pins are singletons, so an identity scan over a handful of entries
+    # beats hashing the pin object on every lookup.
+    _dio_registry = []
+    _ain_registry = []
+
+    # Parsed pause configs, keyed by filename, so re-construction skips
+    # the flash read and string parsing.
+    _pause_cache = {}
+
+    # Live countio.Counter instances as (pin, counter) pairs; a counter
+    # owns its pin for good, so re-construction must reuse it instead of
+    # trying to claim the pin again.
+    _counter_registry = []
+
+    # Shared keypad.Keys instance, for the same reason: it owns the seven
+    # scan pins once created.
+    _keys_shared = None
+
+    # ids of pins currently configured as INPUT + PULL_UP, so registry
+    # hits skip the direction/pull setters (each one reprograms the pad
+    # through the pin HAL).
+    _dio_configured = set()
+
+    # Quiet time before the polling scan commits a new input state.
+    DEBOUNCE_MS = 10
+
+    # Scan order; matches the keypad pin order so key_number is an index.
+    INPUT_NAMES = ("a", "b", "up", "down", "left", "right", "click")
+
+    # Event hook attribute per input, aligned with INPUT_NAMES.
+    HOOK_NAMES = ("on_button_a", "on_button_b", "on_joystick_up",
+                  "on_joystick_down", "on_joystick_left",
+                  "on_joystick_right", "on_joystick_click")
 
     def __init__(
         self,
@@ -34,56 +93,170 @@ class PixelKit:
         # --- NeoPixels ---
         self.neopixel_instance = neopixel.NeoPixel(board.D4, 128, auto_write=False)
         self.matrix_instance = PixelFramebuffer(self.neopixel_instance, 16, 8)
+        self._dirty = True
+        # True when the strip buffer already matches the framebuffer, so
+        # render() can show() directly instead of re-converting 128 pixels.
+        self._strip_synced = False
+        self._solid_bufs = {}  # color -> (framebuffer bytes, strip bytes)
+        # Black is all zeros in both layouts, so one buffer serves the
+        # clear() fast path and the pause shutdown without allocating.
+        self._black_buf = bytes(128 * 3)
+        self._solid_bufs[0x000000] = (self._black_buf, self._black_buf)
 
         # --- Pause Button ---
+        self._pause_pin = None
         self.pause = pause if pause is not None else self._load_pause_from_file(pause_config_file)
+        self._pause_counter = None
+        if self._pause_pin is not None:
+            for pin, counter in PixelKit._counter_registry:
+                if pin is self._pause_pin:
+                    self._pause_counter = counter
+                    break
+        # Pins the button/joystick scan and the reset button own. The
+        # pause pin may alias one of these (the shipped config maps pause
+        # onto button A's D18 so pressing A pauses); the shared registry
+        # dio must then stay in place and keep being polled.
+        scan_pins = (board.D18, board.D23, board.D35, board.D34,
+                     board.D26, board.D25, board.D27)
+        reserved_pins = scan_pins + (board.D5,)
+        if (countio is not None and self.pause is not None
+                and self._pause_pin is not None
+                and not any(self._pause_pin is p for p in reserved_pins)):
+            # Hand the pin to a native edge counter: the falling edge is
+            # latched in C with no per-frame Python polling cost. Only a
+            # pause-exclusive pin gets converted, so the dio being retired
+            # here was created by our own config loader.
+            self.pause.deinit()
+            PixelKit._dio_configured.discard(id(self._pause_pin))
+            for entry in PixelKit._dio_registry:
+                if entry[0] is self._pause_pin:
+                    PixelKit._dio_registry.remove(entry)
+                    break
+            self.pause = None
+            self._pause_counter = countio.Counter(
+                self._pause_pin, edge=countio.Edge.FALL, pull=digitalio.Pull.UP
+            )
+            PixelKit._counter_registry.append((self._pause_pin, self._pause_counter))
 
         # --- Digital Pins ---
-        self.button_A = self._init_dio(button_A, board.D18)
-        self.button_B = self._init_dio(button_B, board.D23)
         self.button_reset = self._init_dio(button_reset, board.D5)
-        self.joystick_up = self._init_dio(joystick_up, board.D35)
-        self.joystick_down = self._init_dio(joystick_down, board.D34)
-        self.joystick_left = self._init_dio(joystick_left, board.D26)
-        self.joystick_right = self._init_dio(joystick_right, board.D25)
-        self.joystick_click = self._init_dio(joystick_click, board.D27)
+
+        custom_inputs = (button_A, button_B, joystick_up, joystick_down,
+                         joystick_left, joystick_right, joystick_click)
+        # The pause config may map pause onto one of the scan pins (the
+        # shipped config uses button A's D18, deliberately sharing one
+        # registry dio so pressing A pauses). keypad.Keys claims its pins
+        # exclusively, so that layout must keep the shared polling scan.
+        pause_shares_scan_pin = any(self._pause_pin is p for p in scan_pins)
+        if (keypad is not None and not pause_shares_scan_pin
+                and not any(d is not None for d in custom_inputs)):
+            # Scan buttons + joystick with the native keypad module: pins
+            # are sampled and debounced in the background and press/release
+            # events arrive through a ring buffer, so check_controls does
+            # one C-level events.get() instead of seven Python pin reads.
+            if PixelKit._keys_shared is None:
+                PixelKit._keys_shared = keypad.Keys(
+                    scan_pins,
+                    value_when_pressed=False,
+                    pull=True,
+                )
+            self._keys = PixelKit._keys_shared
+            self.button_A = None
+            self.button_B = None
+            self.joystick_up = None
+            self.joystick_down = None
+            self.joystick_left = None
+            self.joystick_right = None
+            self.joystick_click = None
+        else:
+            self._keys = None
+            self.button_A = self._init_dio(button_A, board.D18)
+            self.button_B = self._init_dio(button_B, board.D23)
+            self.joystick_up = self._init_dio(joystick_up, board.D35)
+            self.joystick_down = self._init_dio(joystick_down, board.D34)
+            self.joystick_left = self._init_dio(joystick_left, board.D26)
+            self.joystick_right = self._init_dio(joystick_right, board.D25)
+            self.joystick_click = self._init_dio(joystick_click, board.D27)
 
         # --- Analog Pins ---
         self.dial = self._init_ain(dial, board.VP)
-        self.microphone = self._init_ain(microphone, board.VN)
+        if microphone is None and analogbufio is not None:
+            # The mic is an AC signal, so a single .value sample says very
+            # little. Let DMA fill a small buffer at a fixed rate and
+            # report peak-to-peak amplitude instead.
+            self.microphone = analogbufio.BufferedIn(board.VN, sample_rate=16000)
+            self._mic_buf = array.array("H", bytes(2 * 64))
+        else:
+            self.microphone = self._init_ain(microphone, board.VN)
+            self._mic_buf = None
 
         # --- State ---
+        # Deadbands (in 16-bit ADC counts) keep noisy analog inputs from
+        # firing their callbacks on every loop iteration.
+        self.dial_deadband = 256
+        self.mic_deadband = 512
         self.dial_value = self.dial.value
-        self.microphone_value = self.microphone.value
-        self.is_pressing_up = False
-        self.is_pressing_down = False
-        self.is_pressing_left = False
-        self.is_pressing_right = False
-        self.is_pressing_click = False
-        self.is_pressing_a = False
-        self.is_pressing_b = False
+        self._dial_ema = self.dial_value
+        self.microphone_value = 0 if self._mic_buf is not None else self.microphone.value
+        # --- Input scan table ---
+        # The tables carry hook *names*, not bound methods: the per-frame
+        # scan still never builds strings or touches getattr, and the one
+        # getattr per committed press (presses are human-rate) keeps
+        # post-construction `kit.on_button_a = handler` assignments live.
+        if self._keys is None:
+            dios = (self.button_A, self.button_B, self.joystick_up,
+                    self.joystick_down, self.joystick_left,
+                    self.joystick_right, self.joystick_click)
+            self._inputs = tuple(
+                (dio, self.HOOK_NAMES[i], i) for i, dio in enumerate(dios)
+            )
+        else:
+            self._inputs = ()
+        self._pressed = bytearray(len(self.HOOK_NAMES))
+        self._raw = bytearray(len(self.HOOK_NAMES))
+        for dio, _hook, i in self._inputs:
+            self._raw[i] = 0 if dio.value else 1
+        self._last_change_ms = supervisor.ticks_ms()
+
+        # --- Pause fast path ---
+        # Without a pause button the per-frame check collapses to a no-op;
+        # with one, the .value property getter is bound once up front so
+        # the hot path is a single native read.
+        if self._pause_counter is not None:
+            self._update_pause = self._update_pause_counter
+        elif self.pause is None:
+            self._update_pause = self._noop
+        else:
+            try:
+                self._pause_read = type(self.pause).value.fget.__get__(self.pause)
+            except AttributeError:
+                pause = self.pause
+                self._pause_read = lambda: pause.value
 
     # -------- Pin helpers with registry --------
     def _init_dio(self, instance, board_pin):
         """Return existing DigitalInOut or create new one safely."""
         if instance is not None:
             return instance
-        if board_pin in PixelKit._dio_registry:
-            return PixelKit._dio_registry[board_pin]
+        for pin, dio in PixelKit._dio_registry:
+            if pin is board_pin:
+                return dio
         dio = digitalio.DigitalInOut(board_pin)
         dio.direction = digitalio.Direction.INPUT
         dio.pull = digitalio.Pull.UP
-        PixelKit._dio_registry[board_pin] = dio
+        PixelKit._dio_configured.add(id(board_pin))
+        PixelKit._dio_registry.append((board_pin, dio))
         return dio
 
     def _init_ain(self, instance, board_pin):
         """Return existing AnalogIn or create new one safely."""
         if instance is not None:
             return instance
-        if board_pin in PixelKit._ain_registry:
-            return PixelKit._ain_registry[board_pin]
+        for pin, ain in PixelKit._ain_registry:
+            if pin is board_pin:
+                return ain
         ain = analogio.AnalogIn(board_pin)
-        PixelKit._ain_registry[board_pin] = ain
+        PixelKit._ain_registry.append((board_pin, ain))
         return ain
 
     # -------- Pause config helper --------
@@ -91,7 +264,30 @@ class PixelKit:
         """
         Reads '<PIN_NAME>,<DIR>' from root file, e.g. 'D15,IN'.
         Returns a configured DigitalInOut or None if file missing/invalid.
+        Parsed configs are cached per filename so repeated construction
+        skips the flash read entirely. A compiled config module, once
+        generated, takes precedence over the txt file - delete the
+        generated .py to pick up txt edits.
         """
+        # Fast paths: the in-session cache, then a previously compiled
+        # config module that resolves the pin at import time. Guarded the
+        # same way as the parse path so a pin conflict degrades to "no
+        # pause button" instead of crashing construction.
+        modname = filename.rsplit(".", 1)[0]
+        try:
+            cached = PixelKit._pause_cache.get(filename)
+            if cached is None:
+                module = __import__(modname)
+                cached = (module.PIN, module.DIR)
+                PixelKit._pause_cache[filename] = cached
+                print("Pause button from compiled config:", cached[0], cached[1])
+            return self._configure_pause(*cached)
+        except (ImportError, AttributeError):
+            pass
+        except Exception as e:
+            print("Pause config error:", e)
+            return None
+
         try:
             with open(filename, "r") as f:
                 line = f.readline().strip()
@@ -99,31 +295,34 @@ class PixelKit:
                 print("Pause config empty -> no pause button")
                 return None
 
-            parts = [p.strip() for p in line.split(",")]
-            if len(parts) != 2:
+            # Scan the line manually: split() allocates a list plus two
+            # strings and upper() a third, which adds up on a small heap
+            # right after soft-reset.
+            comma = line.find(",")
+            if comma < 0 or line.find(",", comma + 1) >= 0:
                 print("Pause config malformed -> no pause button")
                 return None
 
-            pin_name, direction = parts[0], parts[1].upper()
+            pin_name = line[:comma].strip()
+            direction = line[comma + 1:].strip()
+            if direction in ("IN", "in", "In"):
+                direction = "IN"
+            elif direction in ("OUT", "out", "Out"):
+                direction = "OUT"
+            else:
+                print("Pause config invalid direction:", direction)
+                return None
+
             try:
                 pin_obj = getattr(board, pin_name)
             except AttributeError:
                 print("Pause config pin not found on this board:", pin_name)
                 return None
 
-            # Reuse existing DigitalInOut if available
-            dio = self._init_dio(None, pin_obj)
-            if direction == "IN":
-                dio.direction = digitalio.Direction.INPUT
-                dio.pull = digitalio.Pull.UP
-            elif direction == "OUT":
-                dio.direction = digitalio.Direction.OUTPUT
-            else:
-                print("Pause config invalid direction:", direction)
-                return None
-
+            PixelKit._pause_cache[filename] = (pin_obj, direction)
+            self._compile_pause_config(modname, pin_name, direction)
             print("Pause button from config:", pin_name, direction)
-            return dio
+            return self._configure_pause(pin_obj, direction)
 
         except OSError:
             return None
@@ -131,56 +330,165 @@ class PixelKit:
             print("Pause config error:", e)
             return None
 
+    def _compile_pause_config(self, modname, pin_name, direction):
+        """
+        Write a small module that resolves the configured pin at import
+        time, so later boots skip the text parse. The generated module
+        shadows the txt file from then on: delete it after editing the
+        txt, or the edit is ignored. Best effort only: the CIRCUITPY
+        filesystem is usually read-only to code.
+        """
+        try:
+            with open(modname + ".py", "w") as f:
+                f.write("from board import %s as PIN\nDIR = %r\n"
+                        % (pin_name, direction))
+        except (OSError, RuntimeError):
+            pass
+
+    def _configure_pause(self, pin_obj, direction):
+        if direction == "IN":
+            for pin, _counter in PixelKit._counter_registry:
+                if pin is pin_obj:
+                    # A live Counter from an earlier construction already
+                    # owns this pin; __init__ picks it up from the registry.
+                    self._pause_pin = pin_obj
+                    return None
+        # Reuse existing DigitalInOut if available
+        dio = self._init_dio(None, pin_obj)
+        if direction == "IN":
+            if id(pin_obj) not in PixelKit._dio_configured:
+                dio.direction = digitalio.Direction.INPUT
+                dio.pull = digitalio.Pull.UP
+                PixelKit._dio_configured.add(id(pin_obj))
+            self._pause_pin = pin_obj  # eligible for the countio path
+        else:
+            dio.direction = digitalio.Direction.OUTPUT
+            PixelKit._dio_configured.discard(id(pin_obj))
+        return dio
+
     # -------- Input scanning --------
     def check_controls(self):
-        self._check_joystick()
-        self._check_buttons()
+        # The digital scan is inlined here rather than split across
+        # _check_joystick/_check_buttons-style helpers: each Python call
+        # frame costs about a microsecond on a Cortex-M4, and this runs
+        # every loop iteration.
+        if self._keys is not None:
+            self._drain_keys()
+        else:
+            # QMK-style "sym_defer_g" debounce: one shared timestamp, and
+            # raw samples are only committed after DEBOUNCE_MS of quiet.
+            raw = self._raw
+            changed = False
+            for dio, _hook, i in self._inputs:
+                value = 0 if dio.value else 1  # active-low
+                if raw[i] != value:
+                    raw[i] = value
+                    changed = True
+            now = supervisor.ticks_ms()
+            if changed:
+                self._last_change_ms = now
+            elif (now - self._last_change_ms) & _TICKS_MAX >= self.DEBOUNCE_MS:
+                pressed = self._pressed
+                for _dio, hook, i in self._inputs:
+                    if raw[i] != pressed[i]:
+                        pressed[i] = raw[i]
+                        if raw[i]:
+                            getattr(self, hook)()
         self._check_dial()
         self._check_microphone()
         self._update_pause()
 
-    def _check_joystick(self):
-        self._check_digital(self.joystick_up, "up", is_joystick=True)
-        self._check_digital(self.joystick_down, "down", is_joystick=True)
-        self._check_digital(self.joystick_left, "left", is_joystick=True)
-        self._check_digital(self.joystick_right, "right", is_joystick=True)
-        self._check_digital(self.joystick_click, "click", is_joystick=True)
-
-    def _check_buttons(self):
-        self._check_digital(self.button_A, "a")
-        self._check_digital(self.button_B, "b")
-
-    def _check_digital(self, dio, name, is_joystick=False):
-        state_attr = f"is_pressing_{name}"
-        event_method = getattr(self, f"on_{'joystick_' if is_joystick else 'button_'}{name}")
-        pressing = getattr(self, state_attr)
-        if not dio.value and not pressing:
-            setattr(self, state_attr, True)
-            event_method()
-        elif dio.value and pressing:
-            setattr(self, state_attr, False)
+    def _drain_keys(self):
+        events = self._keys.events
+        pressed = self._pressed
+        hooks = self.HOOK_NAMES
+        event = events.get()
+        while event:
+            key = event.key_number
+            if event.pressed:
+                pressed[key] = 1
+                getattr(self, hooks[key])()
+            else:
+                pressed[key] = 0
+            event = events.get()
+
+    def poll_state(self):
+        """
+        Read all scanned inputs into one bitmask (BTN_A, JS_UP, ...) with
+        no callback dispatch, for tight game loops that branch on state
+        directly. Use either this or check_controls each frame, not both.
+        """
+        state = 0
+        if self._keys is not None:
+            events = self._keys.events
+            pressed = self._pressed
+            event = events.get()
+            while event:
+                pressed[event.key_number] = 1 if event.pressed else 0
+                event = events.get()
+            for i in range(len(pressed)):
+                if pressed[i]:
+                    state |= 1 << i
+        else:
+            bit = 1
+            for dio, _hook, _i in self._inputs:
+                if not dio.value:  # active-low
+                    state |= bit
+                bit <<= 1
+        return state
+
+    def is_pressing(self, name):
+        """Debounced pressed state of an input by name, e.g. 'a' or 'up'."""
+        return bool(self._pressed[self.INPUT_NAMES.index(name)])
 
     def _check_dial(self):
-        new_value = self.dial.value
-        if new_value != self.dial_value:
+        # Low-pass the pot (7/8 old + 1/8 new), then only report moves
+        # larger than the deadband.
+        self._dial_ema = (self._dial_ema * 7 + self.dial.value) >> 3
+        new_value = self._dial_ema
+        if abs(new_value - self.dial_value) > self.dial_deadband:
             self.dial_value = new_value
             self.on_dial(new_value)
 
     def _check_microphone(self):
-        new_value = self.microphone.value
-        if new_value != self.microphone_value:
+        if self._mic_buf is not None:
+            # Peak-to-peak amplitude over one DMA-filled buffer.
+            self.microphone.readinto(self._mic_buf)
+            new_value = max(self._mic_buf) - min(self._mic_buf)
+        else:
+            new_value = self.microphone.value
+        if abs(new_value - self.microphone_value) > self.mic_deadband:
             self.microphone_value = new_value
             self.on_microphone(new_value)
 
     # -------- Pause behavior --------
+    def _noop(self):
+        pass
+
     def _update_pause(self):
-        if self.pause and not self.pause.value:  # active-low
+        if not self._pause_read():  # active-low
+            self._pause_exit()
+
+    def _update_pause_counter(self):
+        if self._pause_counter.count:
+            self._pause_exit()
+
+    def _pause_exit(self):
+        # fill() builds a fresh pixel buffer; copy the preallocated black
+        # buffer straight into the strip instead when it is exposed.
+        buf = getattr(self.neopixel_instance, "buf", None)
+        if buf is None:
             self.neopixel_instance.fill((0, 0, 0))
-            self.neopixel_instance.show()
-            print("Pause pressed -> exiting")
-            sys.exit()
+        else:
+            buf[len(buf) - len(self._black_buf):] = self._black_buf
+        self.neopixel_instance.show()
+        print("Pause pressed -> exiting")
+        import sys  # only needed on the exit path
+        sys.exit()
 
     # -------- Event hooks (override) --------
+    # Override in a subclass or assign per instance at any time
+    # (kit.on_button_a = handler); dispatch looks them up on each press.
     def on_joystick_up(self): return False
     def on_joystick_down(self): return False
     def on_joystick_left(self): return False
@@ -194,12 +502,55 @@ class PixelKit:
     # -------- LED helpers --------
     def set_pixel(self, x, y, color=0x00FF00):
         self.matrix_instance.pixel(x, y, color)
+        self._dirty = True
+        self._strip_synced = False
 
     def set_background(self, color=0x00FF00):
-        self.matrix_instance.fill(color)
+        # Solid fills skip the framebuffer's per-pixel Python loop: blast
+        # a precomputed byte pattern into both the framebuffer bytearray
+        # and the raw strip buffer, so render() only has to show().
+        fb_buf = getattr(self.matrix_instance, "_buffer", None)
+        strip_buf = getattr(self.neopixel_instance, "buf", None)
+        if fb_buf is None or strip_buf is None or len(fb_buf) != 128 * 3:
+            self.matrix_instance.fill(color)
+            self._dirty = True
+            self._strip_synced = False
+            return
+        bufs = self._solid_bufs.get(color)
+        if bufs is None:
+            r = (color >> 16) & 0xFF
+            g = (color >> 8) & 0xFF
+            b = color & 0xFF
+            # Framebuffer stores RGB888; the strip wants GRB.
+            bufs = (bytes((r, g, b)) * 128, bytes((g, r, b)) * 128)
+            self._solid_bufs[color] = bufs
+        fb_buf[:] = bufs[0]
+        # Sync the diffing double buffer too, otherwise the next render()
+        # that goes through display() (e.g. after one set_pixel) sees
+        # every filled pixel as changed and rewrites all 128 in Python.
+        db_buf = getattr(self.matrix_instance, "_double_buffer", None)
+        if db_buf is not None and len(db_buf) == len(bufs[0]):
+            db_buf[:] = bufs[0]
+        strip_buf[len(strip_buf) - len(bufs[1]):] = bufs[1]
+        self._dirty = True
+        self._strip_synced = True
 
     def clear(self):
         self.set_background(0x000000)
 
     def render(self):
+        """Push the framebuffer to the strip, but only when it changed."""
+        if not self._dirty:
+            return
+        if self._strip_synced:
+            self.neopixel_instance.show()
+        else:
+            self.matrix_instance.display()
+        self._dirty = False
+        self._strip_synced = False
+
+    def force_render(self):
+        """Push unconditionally, for callers that bypass set_pixel."""
         self.matrix_instance.display()
+        self._dirty = False
+        self._strip_synced = False